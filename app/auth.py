@@ -1,38 +1,70 @@
-from fastapi import Request, HTTPException
-from base64 import b64decode
+import hmac
+from fastapi import HTTPException, Request, Security
+from fastapi.security import (
+    APIKeyHeader,
+    HTTPAuthorizationCredentials,
+    HTTPBasic,
+    HTTPBasicCredentials,
+    HTTPBearer,
+)
 from .config import BASIC_USER, BASIC_PASS, API_KEY, BEARER_TOKEN
 
 
-def validate_basic(auth_header: str):
-    try:
-        encoded = auth_header.split(" ")[1]
-        decoded = b64decode(encoded).decode()
-        username, password = decoded.split(":")
-        return username == BASIC_USER and password == BASIC_PASS
-    except Exception:
-        return False
+# Precomputed so each request is a constant-time byte comparison
+_BASIC_USER_EXPECTED = BASIC_USER.encode()
+_BASIC_PASS_EXPECTED = BASIC_PASS.encode()
+_API_KEY_EXPECTED = API_KEY.encode()
+_BEARER_EXPECTED = BEARER_TOKEN.encode()
 
 
-async def authenticate(request: Request, allowed: list):
-    auth_header = request.headers.get("authorization")
-    api_key = request.headers.get("x-api-key")
+class OptionalHTTPBasic(HTTPBasic):
+    # HTTPBasic raises on a malformed Basic value even with auto_error=False;
+    # treat it as absent so another allowed credential can still pass
+    async def __call__(self, request: Request):
+        try:
+            return await super().__call__(request)
+        except HTTPException:
+            return None
 
-    if not auth_header and not api_key:
-        if "none" in allowed:
-            return
-        raise HTTPException(status_code=401, detail="Unauthorized")
 
-    if api_key and "apikey" in allowed:
-        if api_key == API_KEY:
-            return
-        raise HTTPException(status_code=401, detail="Invalid API Key")
+# auto_error=False lets authenticate() decide which schemes an endpoint accepts
+api_key_scheme = APIKeyHeader(name="x-api-key", auto_error=False)
+basic_scheme = OptionalHTTPBasic(auto_error=False, scheme_name="HTTPBasic")
+bearer_scheme = HTTPBearer(auto_error=False)
+
+
+def validate_basic(credentials: HTTPBasicCredentials):
+    user_ok = hmac.compare_digest(credentials.username.encode(), _BASIC_USER_EXPECTED)
+    pass_ok = hmac.compare_digest(credentials.password.encode(), _BASIC_PASS_EXPECTED)
+    return user_ok and pass_ok
+
+
+def validate_bearer(credentials: HTTPAuthorizationCredentials):
+    return hmac.compare_digest(credentials.credentials.encode(), _BEARER_EXPECTED)
+
 
-    if auth_header:
-        if auth_header.startswith("Basic") and "basic" in allowed:
-            if validate_basic(auth_header):
+def authenticate(allowed: frozenset[str]):
+    async def dependency(
+        api_key: str | None = Security(api_key_scheme),
+        basic: HTTPBasicCredentials | None = Security(basic_scheme),
+        bearer: HTTPAuthorizationCredentials | None = Security(bearer_scheme),
+    ):
+        if not api_key and not basic and not bearer:
+            if "none" in allowed:
                 return
-        if auth_header.startswith("Bearer") and "bearer" in allowed:
-            if auth_header.split(" ")[1] == BEARER_TOKEN:
+            raise HTTPException(status_code=401, detail="Unauthorized")
+
+        if api_key and "apikey" in allowed:
+            if hmac.compare_digest(api_key.encode(), _API_KEY_EXPECTED):
                 return
+            raise HTTPException(status_code=401, detail="Invalid API Key")
+
+        if basic and "basic" in allowed and validate_basic(basic):
+            return
+
+        if bearer and "bearer" in allowed and validate_bearer(bearer):
+            return
+
+        raise HTTPException(status_code=401, detail="Unauthorized")
 
-    raise HTTPException(status_code=401, detail="Unauthorized")
\ No newline at end of file
+    return dependency
@@ -0,0 +1,159 @@
+import hashlib
+import json
+import re
+import time
+
+from fastapi import Request, Response
+from redis import Redis
+from redis.asyncio import Redis as AsyncRedis
+from redis.exceptions import RedisError
+from sqlalchemy import text
+
+from app.config import REDIS_URL, SNAPSHOT_INTERVAL_SECONDS, CACHE_STALE_SECONDS
+from app.database import async_engine
+
+
+# Redis should run with maxmemory-policy allkeys-lfu so hot endpoints stay cached.
+# Both timeouts are short so a stalled Redis costs a request (or the scheduler
+# job) a fraction of a second rather than blocking it
+REDIS_OPTIONS = {"socket_connect_timeout": 0.25, "socket_timeout": 0.25}
+
+redis_client = AsyncRedis.from_url(REDIS_URL, **REDIS_OPTIONS)
+sync_redis_client = Redis.from_url(REDIS_URL, **REDIS_OPTIONS)
+
+CACHE_PREFIX = "snapshots:"
+
+# Bumped once per snapshot; entries from older generations are never read
+# again and simply age out through their TTL
+GENERATION_KEY = CACHE_PREFIX + "generation"
+
+# Data only changes when the scheduler writes a new snapshot
+FRESH_SECONDS = SNAPSHOT_INTERVAL_SECONDS + 1
+
+CACHED_PATHS = (
+    re.compile(r"^/api/v1/public/summary$"),
+    re.compile(r"^/api/v1/snapshots/latest$"),
+    re.compile(r"^/api/v1/snapshots$"),
+    re.compile(r"^/api/v1/facilities/[^/]+/history$"),
+)
+
+# Same response for every caller, so credentials stay out of the key
+PUBLIC_PATHS = (
+    re.compile(r"^/api/v1/public/summary$"),
+)
+
+
+# =====================================================
+# KEYS
+# =====================================================
+
+def is_cacheable(request: Request):
+    if request.method != "GET":
+        return False
+    return any(p.match(request.url.path) for p in CACHED_PATHS)
+
+
+def cache_key(request: Request, generation: str):
+    parts = [request.url.path, request.url.query]
+
+    # Credentials are part of the key so a cached 200 is never
+    # served to a caller the handler would have rejected
+    if not any(p.match(request.url.path) for p in PUBLIC_PATHS):
+        parts.append(request.headers.get("authorization", ""))
+        parts.append(request.headers.get("x-api-key", ""))
+
+    digest = hashlib.sha256("|".join(parts).encode()).hexdigest()
+    return f"{CACHE_PREFIX}{generation}:{digest}"
+
+
+# =====================================================
+# STORAGE
+# =====================================================
+
+async def write_entry(key: str, body: bytes, response: Response):
+    now = time.time()
+    try:
+        async with redis_client.pipeline(transaction=True) as pipe:
+            pipe.hset(key, mapping={
+                "body": body,
+                "status": response.status_code,
+                "headers": json.dumps(dict(response.headers)),
+                "generated_at": now,
+                "stale_at": now + FRESH_SECONDS,
+            })
+            pipe.expire(key, CACHE_STALE_SECONDS)
+            await pipe.execute()
+    except RedisError:
+        pass
+
+
+def entry_response(entry: dict, state: str):
+    headers = json.loads(entry[b"headers"])
+    headers["x-cache"] = state
+    return Response(
+        content=entry[b"body"],
+        status_code=int(entry[b"status"]),
+        headers=headers
+    )
+
+
+def bust_snapshot_cache():
+    try:
+        sync_redis_client.incr(GENERATION_KEY)
+    except RedisError:
+        pass
+
+
+# =====================================================
+# FALLBACK
+# =====================================================
+
+async def ping_database():
+    try:
+        async with async_engine.connect() as conn:
+            await conn.execute(text("SELECT 1"))
+        return True
+    except Exception:
+        return False
+
+
+# =====================================================
+# MIDDLEWARE
+# =====================================================
+
+async def response_cache(request: Request, call_next):
+    if not is_cacheable(request):
+        return await call_next(request)
+
+    try:
+        generation = await redis_client.get(GENERATION_KEY)
+        key = cache_key(request, (generation or b"0").decode())
+        entry = await redis_client.hgetall(key)
+    except RedisError:
+        # Redis is unreachable; skip the write too instead of paying its
+        # timeout a second time on this request
+        return await call_next(request)
+
+    if entry:
+        if float(entry[b"stale_at"]) > time.time():
+            return entry_response(entry, "HIT")
+
+        # Serve the last good response while the database is down
+        if not await ping_database():
+            return entry_response(entry, "STALE")
+
+    response = await call_next(request)
+
+    if response.status_code != 200:
+        return response
+
+    body = b"".join([chunk async for chunk in response.body_iterator])
+    await write_entry(key, body, response)
+
+    headers = dict(response.headers)
+    headers["x-cache"] = "MISS"
+    return Response(
+        content=body,
+        status_code=response.status_code,
+        headers=headers
+    )
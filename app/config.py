@@ -1,5 +1,14 @@
+import os
+
 SERVICE_NAME = "facility-management-api"
 
+PROFILING = os.getenv("PROFILING") == "1"
+
+SNAPSHOT_INTERVAL_SECONDS = 2
+
+REDIS_URL = "redis://localhost:6379/0"
+CACHE_STALE_SECONDS = 60
+
 BASIC_USER = "fm_admin"
 BASIC_PASS = "Fm@2026!"
 
@@ -10,4 +19,10 @@ FACILITY_SEED = [
     {"id": "F001", "name": "Corporate HQ", "city": "Chennai", "capacity": 1200},
     {"id": "F002", "name": "Tech Park", "city": "Bangalore", "capacity": 2000},
     {"id": "F003", "name": "Warehouse", "city": "Hyderabad", "capacity": 800},
-]
\ No newline at end of file
+]
+
+HVAC_STATUS_SEED = [
+    {"code": "healthy", "description": "Normal"},
+    {"code": "warning", "description": "Attention required"},
+    {"code": "critical", "description": "Immediate action"},
+]
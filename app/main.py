@@ -1,18 +1,22 @@
 from datetime import datetime
 
-from fastapi import FastAPI, Request, Depends, HTTPException, Query
-from sqlalchemy.orm import Session
-from sqlalchemy import func, text
-
-from app.database import Base, engine, SessionLocal
+from fastapi import FastAPI, Request, Depends, HTTPException, Query, Security
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import Float, Numeric, cast, func, inspect, lambda_stmt, select, text
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.exc import DBAPIError
+
+from app.database import Base, engine, async_engine, SessionLocal, ReadSessionLocal
 from .models import (
     Facility,
     HVACStatus,
     SnapshotExecution,
     FacilityMetric
 )
-from app.config import SERVICE_NAME, FACILITY_SEED
+from app.config import SERVICE_NAME, FACILITY_SEED, HVAC_STATUS_SEED, PROFILING
 from app.auth import authenticate
+from app.cache import response_cache
 from scheduler import (
     start_scheduler,
     pause_scheduler,
@@ -27,9 +31,84 @@ from scheduler import (
 # =====================================================
 
 app = FastAPI(title=SERVICE_NAME)
+app.middleware("http")(response_cache)
 
 Base.metadata.create_all(bind=engine)
 
+# create_all() skips indexes on tables that already exist
+for table in Base.metadata.sorted_tables:
+    for index in table.indexes:
+        try:
+            index.create(bind=engine, checkfirst=True)
+        except DBAPIError:
+            # Another worker created it between the check and the CREATE
+            existing = {i["name"] for i in inspect(engine).get_indexes(table.name)}
+            if index.name not in existing:
+                raise
+
+# Superseded by idx_exec_time_desc
+with engine.begin() as conn:
+    conn.execute(text("DROP INDEX IF EXISTS ix_snapshot_executions_execution_time"))
+
+
+# =====================================================
+# PROFILING (PROFILING=1, then add ?profile=1 to a request)
+# =====================================================
+
+if PROFILING:
+    from fastapi.responses import HTMLResponse
+    from opentelemetry import trace
+    from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+    from opentelemetry.instrumentation.fastapi import FastAPIInstrumentor
+    from opentelemetry.instrumentation.sqlalchemy import SQLAlchemyInstrumentor
+    from opentelemetry.sdk.resources import Resource
+    from opentelemetry.sdk.trace import TracerProvider
+    from opentelemetry.sdk.trace.export import BatchSpanProcessor
+    from pyinstrument import Profiler
+
+    # Registered after the cache middleware so it wraps cache hits too
+    @app.middleware("http")
+    async def profile_request(request: Request, call_next):
+        if request.query_params.get("profile") != "1":
+            return await call_next(request)
+
+        profiler = Profiler(interval=0.001, async_mode="enabled")
+        profiler.start()
+        try:
+            response = await call_next(request)
+        finally:
+            # A raising handler must not leave the profiler sampling
+            profiler.stop()
+
+        # Rejected or failed requests keep their real response, so the
+        # profile (stack and source paths) is never shown to a 401
+        if not 200 <= response.status_code < 300:
+            return response
+        return HTMLResponse(profiler.output_html())
+
+    # Spans are exported over OTLP/HTTP; the collector is set with the
+    # standard OTEL_EXPORTER_OTLP_ENDPOINT (default http://localhost:4318)
+    tracer_provider = TracerProvider(
+        resource=Resource.create({"service.name": SERVICE_NAME})
+    )
+    tracer_provider.add_span_processor(BatchSpanProcessor(OTLPSpanExporter()))
+    trace.set_tracer_provider(tracer_provider)
+
+    # One span per endpoint with the SQL it ran nested underneath
+    FastAPIInstrumentor.instrument_app(app, tracer_provider=tracer_provider)
+    SQLAlchemyInstrumentor().instrument(
+        engines=[engine, async_engine.sync_engine],
+        tracer_provider=tracer_provider
+    )
+
+
+# =====================================================
+# AUTH SCHEMES
+# =====================================================
+
+V1_AUTH = Security(authenticate(frozenset({"basic", "apikey"})))
+METRICS_AUTH = Security(authenticate(frozenset({"basic", "apikey", "bearer"})))
+
 
 # =====================================================
 # DB DEPENDENCY
@@ -43,6 +122,32 @@ def get_db():
         db.close()
 
 
+async def get_read_db():
+    async with ReadSessionLocal() as db:
+        yield db
+
+
+# =====================================================
+# HELPERS
+# =====================================================
+
+def insert_ignore(model, rows, conflict_columns):
+    # Already-seeded rows are skipped by the database, so restarts need no probe
+    insert = pg_insert if engine.dialect.name == "postgresql" else sqlite_insert
+    return insert(model).values(rows).on_conflict_do_nothing(
+        index_elements=conflict_columns
+    )
+
+
+def rounded_avg(column):
+    # Postgres only has ROUND(numeric, int), so cast before rounding
+    return func.round(
+        cast(func.coalesce(func.avg(column), 0), Numeric),
+        2,
+        type_=Float
+    )
+
+
 # =====================================================
 # STARTUP (SEED MASTER DATA)
 # =====================================================
@@ -52,17 +157,10 @@ async def startup():
     db = SessionLocal()
 
     # Seed HVAC statuses
-    if not db.query(HVACStatus).first():
-        db.add_all([
-            HVACStatus(code="healthy", description="Normal"),
-            HVACStatus(code="warning", description="Attention required"),
-            HVACStatus(code="critical", description="Immediate action"),
-        ])
+    db.execute(insert_ignore(HVACStatus, HVAC_STATUS_SEED, ["code"]))
 
     # Seed Facilities
-    if not db.query(Facility).first():
-        for f in FACILITY_SEED:
-            db.add(Facility(**f))
+    db.execute(insert_ignore(Facility, FACILITY_SEED, ["id"]))
 
     db.commit()
     db.close()
@@ -83,10 +181,10 @@ async def shutdown():
 # =====================================================
 
 @app.get("/health")
-async def health_check(db: Session = Depends(get_db)):
+async def health_check(db: AsyncSession = Depends(get_read_db)):
     try:
         # Check database connection
-        db.execute(text("SELECT 1"))
+        await db.execute(text("SELECT 1"))
 
         # Check scheduler state
         scheduler_running = scheduler.running
@@ -109,9 +207,14 @@ async def health_check(db: Session = Depends(get_db)):
         )
 
 @app.get("/api/v1/public/summary")
-async def public_summary(db: Session = Depends(get_db)):
-    total_snapshots = db.query(SnapshotExecution).count()
-    total_records = db.query(FacilityMetric).count()
+async def public_summary(db: AsyncSession = Depends(get_read_db)):
+    result = await db.execute(
+        select(
+            select(func.count()).select_from(SnapshotExecution).scalar_subquery(),
+            select(func.count()).select_from(FacilityMetric).scalar_subquery()
+        )
+    )
+    total_snapshots, total_records = result.one()
 
     return {
         "service": SERVICE_NAME,
@@ -124,27 +227,43 @@ async def public_summary(db: Session = Depends(get_db)):
 # ---------------- V1 ENDPOINTS ----------------------
 # =====================================================
 
-@app.get("/api/v1/snapshots/count")
-async def snapshot_count(request: Request, db: Session = Depends(get_db)):
-    await authenticate(request, ["basic", "apikey"])
-    count = db.query(SnapshotExecution).count()
+@app.get("/api/v1/snapshots/count", dependencies=[V1_AUTH])
+async def snapshot_count(db: AsyncSession = Depends(get_read_db)):
+    # Retention only keeps the newest rows, so this reports lifetime
+    # executions from the highest id rather than counting what's left. It's
+    # an upper bound: a rolled-back insert still consumes a sequence value
+    result = await db.execute(select(func.max(SnapshotExecution.id)))
+    count = result.scalar() or 0
     return {"total_executions": count}
 
 
-@app.get("/api/v1/snapshots/latest")
-async def latest_snapshot(request: Request, db: Session = Depends(get_db)):
-    await authenticate(request, ["basic", "apikey"])
-
-    snapshot = db.query(SnapshotExecution).order_by(
-        SnapshotExecution.execution_time.desc()
-    ).first()
+@app.get("/api/v1/snapshots/latest", dependencies=[V1_AUTH])
+async def latest_snapshot(db: AsyncSession = Depends(get_read_db)):
+    result = await db.execute(lambda_stmt(
+        lambda: select(
+            SnapshotExecution.id,
+            SnapshotExecution.execution_time,
+            SnapshotExecution.status,
+            FacilityMetric.facility_id,
+            FacilityMetric.occupancy,
+            FacilityMetric.energy_kwh,
+            FacilityMetric.water_liters,
+            FacilityMetric.open_tickets,
+            FacilityMetric.recorded_at
+        ).outerjoin(
+            FacilityMetric, FacilityMetric.snapshot_id == SnapshotExecution.id
+        ).where(
+            SnapshotExecution.id == select(SnapshotExecution.id).order_by(
+                SnapshotExecution.execution_time.desc()
+            ).limit(1).scalar_subquery()
+        )
+    ))
+    rows = result.all()
 
-    if not snapshot:
+    if not rows:
         raise HTTPException(status_code=404, detail="No data available")
 
-    metrics = db.query(FacilityMetric).filter(
-        FacilityMetric.snapshot_id == snapshot.id
-    ).all()
+    snapshot = rows[0]
 
     return {
         "version": "v1",
@@ -153,25 +272,30 @@ async def latest_snapshot(request: Request, db: Session = Depends(get_db)):
         "status": snapshot.status,
         "facilities": [
             {
-                "facility_id": m.facility_id,
-                "occupancy": m.occupancy,
-                "energy_kwh": m.energy_kwh,
-                "water_liters": m.water_liters,
-                "open_tickets": m.open_tickets,
-                "recorded_at": m.recorded_at
+                "facility_id": r.facility_id,
+                "occupancy": r.occupancy,
+                "energy_kwh": r.energy_kwh,
+                "water_liters": r.water_liters,
+                "open_tickets": r.open_tickets,
+                "recorded_at": r.recorded_at
             }
-            for m in metrics
+            for r in rows
+            if r.facility_id is not None
         ]
     }
 
 
-@app.get("/api/v1/snapshots")
-async def list_snapshots(request: Request, db: Session = Depends(get_db)):
-    await authenticate(request, ["basic", "apikey"])
-
-    snapshots = db.query(SnapshotExecution).order_by(
-        SnapshotExecution.execution_time.desc()
-    ).limit(20).all()
+@app.get("/api/v1/snapshots", dependencies=[V1_AUTH])
+async def list_snapshots(db: AsyncSession = Depends(get_read_db)):
+    result = await db.execute(lambda_stmt(
+        lambda: select(
+            SnapshotExecution.id,
+            SnapshotExecution.execution_time,
+            SnapshotExecution.status,
+            SnapshotExecution.execution_duration_ms
+        ).order_by(SnapshotExecution.execution_time.desc()).limit(20)
+    ))
+    snapshots = result.all()
 
     return [
         {
@@ -184,13 +308,21 @@ async def list_snapshots(request: Request, db: Session = Depends(get_db)):
     ]
 
 
-@app.get("/api/v1/facilities/{facility_id}/history")
-async def facility_history(facility_id: str, request: Request, db: Session = Depends(get_db)):
-    await authenticate(request, ["basic", "apikey"])
-
-    records = db.query(FacilityMetric).filter(
-        FacilityMetric.facility_id == facility_id
-    ).order_by(FacilityMetric.recorded_at.desc()).limit(50).all()
+@app.get("/api/v1/facilities/{facility_id}/history", dependencies=[V1_AUTH])
+async def facility_history(facility_id: str, db: AsyncSession = Depends(get_read_db)):
+    result = await db.execute(lambda_stmt(
+        lambda: select(
+            FacilityMetric.snapshot_id,
+            FacilityMetric.occupancy,
+            FacilityMetric.energy_kwh,
+            FacilityMetric.water_liters,
+            FacilityMetric.open_tickets,
+            FacilityMetric.recorded_at
+        ).where(
+            FacilityMetric.facility_id == facility_id
+        ).order_by(FacilityMetric.recorded_at.desc()).limit(50)
+    ))
+    records = result.all()
 
     return {
         "facility_id": facility_id,
@@ -207,64 +339,70 @@ async def facility_history(facility_id: str, request: Request, db: Session = Dep
         ]
     }
 
-@app.get("/api/v1/facilities/{facility_id}/aggregate")
+@app.get("/api/v1/facilities/{facility_id}/aggregate", dependencies=[METRICS_AUTH])
 async def facility_aggregate(
     facility_id: str,
-    request: Request,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_read_db),
     from_time: str = Query(...),
     to_time: str = Query(...)
 ):
-    await authenticate(request, ["basic", "apikey", "bearer"])
-
     try:
         from_dt = datetime.fromisoformat(from_time)
         to_dt = datetime.fromisoformat(to_time)
     except ValueError:
         raise HTTPException(status_code=400, detail="Invalid datetime format.")
 
-    result = db.query(
-        func.avg(FacilityMetric.occupancy),
-        func.avg(FacilityMetric.energy_kwh),
-        func.avg(FacilityMetric.water_liters),
-        func.avg(FacilityMetric.open_tickets)
-    ).filter(
-        FacilityMetric.facility_id == facility_id,
-        FacilityMetric.recorded_at >= from_dt,
-        FacilityMetric.recorded_at <= to_dt
-    ).first()
+    result = await db.execute(
+        select(
+            rounded_avg(FacilityMetric.occupancy),
+            rounded_avg(FacilityMetric.energy_kwh),
+            rounded_avg(FacilityMetric.water_liters),
+            rounded_avg(FacilityMetric.open_tickets)
+        ).where(
+            FacilityMetric.facility_id == facility_id,
+            FacilityMetric.recorded_at >= from_dt,
+            FacilityMetric.recorded_at <= to_dt
+        )
+    )
+    occupancy, energy_kwh, water_liters, open_tickets = result.one()
 
     return {
         "facility_id": facility_id,
         "from_time": from_dt,
         "to_time": to_dt,
         "averages": {
-            "avg_occupancy": round(result[0] or 0, 2),
-            "avg_energy_kwh": round(result[1] or 0, 2),
-            "avg_water_liters": round(result[2] or 0, 2),
-            "avg_open_tickets": round(result[3] or 0, 2)
+            "avg_occupancy": occupancy,
+            "avg_energy_kwh": energy_kwh,
+            "avg_water_liters": water_liters,
+            "avg_open_tickets": open_tickets
         }
     }
 
+
 # =====================================================
 # ---------------- V2 ENHANCED -----------------------
 # =====================================================
 
-@app.get("/api/v2/facilities/{facility_id}/metrics")
-async def facility_metrics_v2(facility_id: str, request: Request, db: Session = Depends(get_db)):
-    await authenticate(request, ["basic", "apikey", "bearer"])
-
-    snapshot = db.query(SnapshotExecution).order_by(
-        SnapshotExecution.execution_time.desc()
-    ).first()
+@app.get("/api/v2/facilities/{facility_id}/metrics", dependencies=[METRICS_AUTH])
+async def facility_metrics_v2(facility_id: str, db: AsyncSession = Depends(get_read_db)):
+    result = await db.execute(lambda_stmt(
+        lambda: select(SnapshotExecution).order_by(
+            SnapshotExecution.execution_time.desc()
+        ).limit(1)
+    ))
+    snapshot = result.scalar_one_or_none()
 
     if not snapshot:
         raise HTTPException(status_code=404, detail="No data available")
 
-    metric = db.query(FacilityMetric).filter(
-        FacilityMetric.snapshot_id == snapshot.id,
-        FacilityMetric.facility_id == facility_id
-    ).first()
+    snapshot_id = snapshot.id
+    result = await db.execute(lambda_stmt(
+        lambda: select(FacilityMetric).where(
+            FacilityMetric.snapshot_id == snapshot_id,
+            FacilityMetric.facility_id == facility_id
+        ).limit(1)
+    ))
+    metric = result.scalar_one_or_none()
 
     if not metric:
         raise HTTPException(status_code=404, detail="Facility not found")
@@ -24,12 +24,17 @@ class SnapshotExecution(Base):
     __tablename__ = "snapshot_executions"
 
     id = Column(Integer, primary_key=True)
-    execution_time = Column(DateTime(timezone=True), nullable=False, index=True)
+    execution_time = Column(DateTime(timezone=True), nullable=False)
     status = Column(String(50), default="running")
     execution_duration_ms = Column(Integer)
 
     created_at = Column(DateTime(timezone=True), server_default=func.now())
 
+    # Also serves ascending range scans, so execution_time needs no index of its own
+    __table_args__ = (
+        Index("idx_exec_time_desc", execution_time.desc(), id),
+    )
+
 
 class HVACStatus(Base):
     __tablename__ = "hvac_statuses"
@@ -44,7 +49,10 @@ class FacilityMetric(Base):
 
     id = Column(Integer, primary_key=True)
 
-    snapshot_id = Column(Integer, ForeignKey("snapshot_executions.id"))
+    snapshot_id = Column(
+        Integer,
+        ForeignKey("snapshot_executions.id", ondelete="CASCADE")
+    )
     facility_id = Column(String(20), ForeignKey("facilities.id"))
     hvac_status_id = Column(Integer, ForeignKey("hvac_statuses.id"))
 
@@ -60,4 +68,5 @@ class FacilityMetric(Base):
     __table_args__ = (
         Index("idx_facility_snapshot", "facility_id", "snapshot_id"),
         Index("idx_facility_recorded", "facility_id", "recorded_at"),
+        Index("idx_snapshot_facility", "snapshot_id", "facility_id"),
     )
\ No newline at end of file
@@ -0,0 +1,60 @@
+from base64 import b64encode
+
+import pytest
+from fastapi import FastAPI, Security
+from fastapi.testclient import TestClient
+
+from app.auth import authenticate
+from app.config import API_KEY, BASIC_PASS, BASIC_USER, BEARER_TOKEN
+
+
+app = FastAPI()
+
+
+@app.get("/v1", dependencies=[Security(authenticate(frozenset({"basic", "apikey"})))])
+async def v1():
+    return {"ok": True}
+
+
+@app.get("/metrics", dependencies=[Security(authenticate(frozenset({"basic", "apikey", "bearer"})))])
+async def metrics():
+    return {"ok": True}
+
+
+client = TestClient(app)
+
+VALID_BASIC = "Basic " + b64encode(f"{BASIC_USER}:{BASIC_PASS}".encode()).decode()
+
+
+@pytest.mark.parametrize("headers, path, status", [
+    ({"x-api-key": API_KEY}, "/v1", 200),
+    ({"authorization": VALID_BASIC}, "/v1", 200),
+    ({"authorization": f"Bearer {BEARER_TOKEN}"}, "/metrics", 200),
+    ({"authorization": f"Bearer {BEARER_TOKEN}"}, "/v1", 401),
+    ({}, "/v1", 401),
+    ({"x-api-key": "wrong"}, "/v1", 401),
+    ({"x-api-key": "wrong", "authorization": VALID_BASIC}, "/v1", 401),
+    ({"authorization": "Basic " + b64encode(b"fm_admin:wrong").decode()}, "/v1", 401),
+    ({"authorization": "Bearer wrong"}, "/metrics", 401),
+])
+def test_credentials(headers, path, status):
+    assert client.get(path, headers=headers).status_code == status
+
+
+@pytest.mark.parametrize("malformed", ["Basic !!!", "Basic Zm9v", "Basic"])
+def test_malformed_basic_does_not_block_api_key(malformed):
+    headers = {"x-api-key": API_KEY, "authorization": malformed}
+    assert client.get("/v1", headers=headers).status_code == 200
+
+
+@pytest.mark.parametrize("malformed", ["Basic !!!", "Basic Zm9v"])
+def test_malformed_basic_alone_is_unauthorized(malformed):
+    response = client.get("/v1", headers={"authorization": malformed})
+    assert response.status_code == 401
+    assert response.json() == {"detail": "Unauthorized"}
+
+
+def test_openapi_security_scheme_names():
+    schemes = app.openapi()["components"]["securitySchemes"]
+    assert set(schemes) == {"APIKeyHeader", "HTTPBasic", "HTTPBearer"}
+    assert schemes["HTTPBasic"] == {"type": "http", "scheme": "basic"}
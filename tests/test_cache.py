@@ -0,0 +1,139 @@
+import fakeredis
+import pytest
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.testclient import TestClient
+from redis.exceptions import TimeoutError as RedisTimeoutError
+
+from app import cache
+
+
+app = FastAPI()
+app.middleware("http")(cache.response_cache)
+
+calls = {"count": 0}
+
+
+@app.get("/api/v1/snapshots")
+async def snapshots(request: Request):
+    calls["count"] += 1
+    if request.headers.get("x-api-key") not in ("key-a", "key-b"):
+        raise HTTPException(status_code=401, detail="Unauthorized")
+    return {"call": calls["count"], "caller": request.headers["x-api-key"]}
+
+
+@app.get("/api/v1/public/summary")
+async def summary():
+    calls["count"] += 1
+    return {"call": calls["count"]}
+
+
+@pytest.fixture
+def redis(monkeypatch):
+    server = fakeredis.FakeServer()
+    monkeypatch.setattr(cache, "redis_client", fakeredis.FakeAsyncRedis(server=server))
+    monkeypatch.setattr(cache, "sync_redis_client", fakeredis.FakeRedis(server=server))
+    calls["count"] = 0
+    return cache.sync_redis_client
+
+
+@pytest.fixture
+def client(redis):
+    return TestClient(app)
+
+
+def set_database_up(monkeypatch, up: bool):
+    async def ping_database():
+        return up
+    monkeypatch.setattr(cache, "ping_database", ping_database)
+
+
+def test_miss_then_hit(client):
+    first = client.get("/api/v1/snapshots", headers={"x-api-key": "key-a"})
+    second = client.get("/api/v1/snapshots", headers={"x-api-key": "key-a"})
+
+    assert first.headers["x-cache"] == "MISS"
+    assert second.headers["x-cache"] == "HIT"
+    assert second.json() == first.json()
+    assert second.headers["content-type"] == "application/json"
+    assert calls["count"] == 1
+
+
+def test_unauthorized_is_not_cached(client):
+    for _ in range(2):
+        response = client.get("/api/v1/snapshots", headers={"x-api-key": "wrong"})
+        assert response.status_code == 401
+        assert "x-cache" not in response.headers
+    assert calls["count"] == 2
+
+
+def test_cached_200_is_not_served_to_other_credentials(client):
+    client.get("/api/v1/snapshots", headers={"x-api-key": "key-a"})
+
+    other = client.get("/api/v1/snapshots", headers={"x-api-key": "key-b"})
+    rejected = client.get("/api/v1/snapshots", headers={"x-api-key": "wrong"})
+    anonymous = client.get("/api/v1/snapshots")
+
+    assert other.headers["x-cache"] == "MISS"
+    assert other.json()["caller"] == "key-b"
+    assert rejected.status_code == 401
+    assert anonymous.status_code == 401
+
+
+def test_public_summary_ignores_credentials(client, redis):
+    client.get("/api/v1/public/summary")
+    client.get("/api/v1/public/summary", headers={"x-api-key": "anything"})
+    client.get("/api/v1/public/summary", headers={"authorization": "junk"})
+
+    assert calls["count"] == 1
+    assert len([k for k in redis.keys() if k != cache.GENERATION_KEY.encode()]) == 1
+
+
+def test_bust_starts_a_new_generation(client):
+    client.get("/api/v1/snapshots", headers={"x-api-key": "key-a"})
+    cache.bust_snapshot_cache()
+    response = client.get("/api/v1/snapshots", headers={"x-api-key": "key-a"})
+
+    assert response.headers["x-cache"] == "MISS"
+    assert calls["count"] == 2
+
+
+def test_stale_entry_refreshed_while_database_is_up(client, monkeypatch):
+    monkeypatch.setattr(cache, "FRESH_SECONDS", -1)
+    set_database_up(monkeypatch, True)
+
+    client.get("/api/v1/snapshots", headers={"x-api-key": "key-a"})
+    response = client.get("/api/v1/snapshots", headers={"x-api-key": "key-a"})
+
+    assert response.headers["x-cache"] == "MISS"
+    assert response.json()["call"] == 2
+
+
+def test_stale_entry_served_while_database_is_down(client, monkeypatch):
+    monkeypatch.setattr(cache, "FRESH_SECONDS", -1)
+    client.get("/api/v1/snapshots", headers={"x-api-key": "key-a"})
+
+    set_database_up(monkeypatch, False)
+    response = client.get("/api/v1/snapshots", headers={"x-api-key": "key-a"})
+
+    assert response.headers["x-cache"] == "STALE"
+    assert response.json()["call"] == 1
+    assert calls["count"] == 1
+
+
+def test_redis_failure_bypasses_cache(client, monkeypatch):
+    class StalledRedis:
+        writes = 0
+
+        async def get(self, key):
+            raise RedisTimeoutError("Timeout reading from socket")
+
+        def pipeline(self, **kwargs):
+            StalledRedis.writes += 1
+            raise AssertionError("cache write attempted after a failed read")
+
+    monkeypatch.setattr(cache, "redis_client", StalledRedis())
+    response = client.get("/api/v1/snapshots", headers={"x-api-key": "key-a"})
+
+    assert response.status_code == 200
+    assert "x-cache" not in response.headers
+    assert StalledRedis.writes == 0
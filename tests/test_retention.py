@@ -0,0 +1,67 @@
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import create_engine, select
+from sqlalchemy.orm import Session
+
+from app.database import Base
+from app.models import FacilityMetric, SnapshotExecution
+from app.scheduler import retain_last_n
+
+
+@pytest.fixture
+def db():
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(bind=engine)
+    with Session(engine) as session:
+        yield session
+    engine.dispose()
+
+
+def add_snapshots(db: Session, count: int):
+    start = datetime(2026, 1, 1)
+    for i in range(count):
+        snapshot = SnapshotExecution(execution_time=start + timedelta(seconds=i))
+        db.add(snapshot)
+        db.flush()
+        for facility_id in ("F001", "F002"):
+            db.add(FacilityMetric(
+                snapshot_id=snapshot.id,
+                facility_id=facility_id,
+                occupancy=1,
+                energy_kwh=1.0,
+                water_liters=1.0,
+                open_tickets=0,
+                recorded_at=snapshot.execution_time,
+            ))
+    db.commit()
+
+
+def test_retain_last_n_keeps_newest_and_their_metrics(db):
+    add_snapshots(db, 65)
+    newest = db.scalars(
+        select(SnapshotExecution.id)
+        .order_by(SnapshotExecution.execution_time.desc())
+        .limit(50)
+    ).all()
+
+    retain_last_n(db, 50)
+
+    kept = db.scalars(select(SnapshotExecution.id)).all()
+    assert sorted(kept) == sorted(newest)
+
+    orphans = db.scalars(
+        select(FacilityMetric.id)
+        .where(FacilityMetric.snapshot_id.not_in(select(SnapshotExecution.id)))
+    ).all()
+    assert orphans == []
+    assert db.query(FacilityMetric).count() == 50 * 2
+
+
+def test_retain_last_n_below_limit_deletes_nothing(db):
+    add_snapshots(db, 10)
+
+    retain_last_n(db, 50)
+
+    assert db.query(SnapshotExecution).count() == 10
+    assert db.query(FacilityMetric).count() == 10 * 2